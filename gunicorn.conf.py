@@ -0,0 +1,32 @@
+"""Gunicorn configuration for running the API with multiple uvicorn workers.
+
+Usage:
+    gunicorn -c gunicorn.conf.py src.api:app
+"""
+
+import logging
+import os
+
+# Gunicorn only configures its own loggers, so set up the app's logging here as
+# main.py does; workers inherit the root handler when they fork
+logging.basicConfig(
+    level=logging.INFO,
+    format="[%(asctime)s] %(levelname)s:     %(name)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+from src.config import PORT  # noqa: E402
+
+bind = f"0.0.0.0:{PORT}"
+
+# One uvicorn worker per core (at least two); uvloop/httptools are picked automatically
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = max(2, os.cpu_count() or 1)
+
+# Keep idle client connections open between requests
+keepalive = 30
+
+# Give each worker its own SO_REUSEPORT listening socket so the kernel spreads
+# incoming connections across workers instead of all contending on one accept
+# queue. The kernel only load-balances these sockets on Linux 3.9+
+reuse_port = True
@@ -13,13 +13,24 @@ Endpoints:
 - GET /quota/glm - GLM (Z.ai/ZHIPU) quota usage and limits
 """
 
+import asyncio
+import calendar
+import contextlib
+import functools
 import logging
+import threading
 import time
 import tomllib
-from datetime import UTC, datetime
+from collections.abc import Callable
+from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+import httpx
+import orjson
+from cachetools import TLRUCache
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse
 
 from . import config  # noqa: F401 Import config to trigger ZAI->ANTHROPIC mapping
 from .cloudcode_client import (
@@ -29,7 +40,10 @@ from .cloudcode_client import (
     load_account,
     normalize_account,
 )
-from .constants import QUOTA_CRITICAL, QUOTA_FULL, QUOTA_GOOD, QUOTA_WARNING
+from .config import QUERY_DEBOUNCE
+from .constants import QUOTA_CRITICAL, QUOTA_FULL, QUOTA_GOOD, QUOTA_WARNING, SECONDS_PER_MINUTE
+from .http_client import close_http_client, get_http_client
+from .models import QuotaModel
 from .zai_client import get_glm_quota
 
 logger = logging.getLogger(__name__)
@@ -43,61 +57,175 @@ def _get_version() -> str:
     return data["project"]["version"]
 
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+# Upper bound on priming, which can sit through a token refresh and several upstream timeouts
+_PRIME_TIMEOUT_SECONDS = 30
+
+
+async def _prime_quota_cache() -> None:
+    """Fetch quota once through /quota/all so early requests hit warm caches."""
+    try:
+        async with asyncio.timeout(_PRIME_TIMEOUT_SECONDS):
+            await get_all_quota()
+        logger.info("Quota cache primed")
+    except TimeoutError:
+        logger.warning("Timed out priming quota cache after %s seconds", _PRIME_TIMEOUT_SECONDS)
+    except Exception as e:
+        # The first request will retry the fetch
+        logger.warning("Failed to prime quota cache: %s", getattr(e, "detail", e))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the upstream HTTP client and warm the quota caches in the background."""
+    get_http_client()
+    # Don't hold up serving (once per gunicorn worker) on the upstream fetch
+    prime_task = asyncio.create_task(_prime_quota_cache())
+    yield
+    prime_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await prime_task
+    await close_http_client()
+
+
 app = FastAPI(
     title="Antigravity Quota API",
     version=_get_version(),
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
-def format_time_remaining(reset_time: str) -> str:
-    """Calculate time remaining until reset in 'Xh Ym' format."""
+def _looks_like_iso(value: str) -> bool:
+    """Cheaply check for a 'YYYY-MM-DDTHH:MM:SS' prefix before parsing."""
+    return (
+        isinstance(value, str)
+        and len(value) >= 19
+        and value[4] == "-"
+        and value[7] == "-"
+        and value[10] == "T"
+        and value[13] == ":"
+        and value[16] == ":"
+        # isdigit() alone also accepts non-ASCII digits such as '²'
+        and value[:19].isascii()
+        and value[0:4].isdigit()
+        and value[5:7].isdigit()
+        and "01" <= value[5:7] <= "12"
+        and value[8:10].isdigit()
+        and value[11:13].isdigit()
+        and value[14:16].isdigit()
+        and value[17:19].isdigit()
+    )
+
+
+def _reset_timestamp(reset_time: str) -> float | None:
+    """Convert an ISO 8601 reset time to a UTC epoch timestamp, or None if invalid."""
+    if not _looks_like_iso(reset_time):
+        return None
+
+    # Fast path for the 'YYYY-MM-DDTHH:MM:SSZ' shape googleapis returns
+    if len(reset_time) == 20 and reset_time[-1] == "Z":
+        year = int(reset_time[0:4])
+        month = int(reset_time[5:7])
+        day = int(reset_time[8:10])
+        hour = int(reset_time[11:13])
+        minute = int(reset_time[14:16])
+        second = int(reset_time[17:19])
+        # timegm() normalizes out-of-range fields; reject what fromisoformat() would
+        if not (
+            year >= 1
+            and 1 <= day <= calendar.monthrange(year, month)[1]
+            and hour < 24
+            and minute < 60
+            and second < 60
+        ):
+            return None
+        return calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+
+    # Fractional seconds or explicit offsets
     try:
         reset_dt = datetime.fromisoformat(reset_time.replace("Z", "+00:00"))
-        now = datetime.now(UTC)
-        delta = reset_dt - now
+    except ValueError:
+        return None
+    if reset_dt.tzinfo is None:
+        return None
+    return reset_dt.timestamp()
 
-        if delta.total_seconds() <= 0:
-            return "Reset due"
 
-        hours = int(delta.total_seconds() // 3600)
-        minutes = int((delta.total_seconds() % 3600) // 60)
-        return f"{hours}h {minutes}m"
-    except Exception:
+def format_time_remaining(reset_time: str) -> str:
+    """Calculate time remaining until reset in 'Xh Ym' format."""
+    reset_ts = _reset_timestamp(reset_time)
+    if reset_ts is None:
         return ""
+    remaining = reset_ts - time.time()
+
+    if remaining <= 0:
+        return "Reset due"
 
+    hours, minutes = divmod(int(remaining) // 60, 60)
+    return f"{hours}h {minutes}m"
 
-def format_quota(quota_data: dict, show_relative: bool = True) -> dict:
-    """Format quota data to match antigravity-mgr account format."""
-    models = quota_data.get("models", {})
-    model_list = []
 
-    for name, info in models.items():
+def format_quota(quota_data: dict, show_relative: bool = True, last_updated: int | None = None) -> dict:
+    """Format quota data to match antigravity-mgr account format.
+
+    last_updated defaults to the current time when the fetch time is unknown.
+    """
+    rows = []
+    for name, info in quota_data.get("models", {}).items():
+        name_lower = name.lower()
+        if "gemini" not in name_lower and "claude" not in name_lower:
+            continue
         quota_info = info.get("quotaInfo", {})
         remaining_fraction = quota_info.get("remainingFraction")
-        reset_time = quota_info.get("resetTime")
-
         if remaining_fraction is not None:
-            name_lower = name.lower()
-            if "gemini" in name_lower or "claude" in name_lower:
-                model_entry = {
-                    "name": name,
-                    "percentage": int(remaining_fraction * 100),
-                    "reset_time": reset_time,
-                }
-                if show_relative and reset_time:
-                    model_entry["reset_time_relative"] = format_time_remaining(reset_time)
-                model_list.append(model_entry)
+            rows.append((name, int(remaining_fraction * 100), quota_info.get("resetTime")))
+
+    # Sort the lightweight tuples, then build one QuotaModel per model
+    rows.sort(key=itemgetter(0))
+    model_list = [
+        QuotaModel(
+            name,
+            percentage,
+            reset_time,
+            format_time_remaining(reset_time) if show_relative and reset_time else None,
+        )
+        for name, percentage, reset_time in rows
+    ]
 
     return {
-        "models": sorted(model_list, key=lambda m: m["name"]),
-        "last_updated": int(time.time()),
+        "models": model_list,
+        "last_updated": int(time.time()) if last_updated is None else last_updated,
         "is_forbidden": False,
     }
 
 
-def filter_models(quota: dict, patterns: list[str]) -> dict:
-    """Filter models by name patterns."""
-    filtered = [m for m in quota["models"] if any(p in m["name"].lower() for p in patterns)]
+@functools.lru_cache(maxsize=32)
+def _pattern_matcher(patterns: tuple[str, ...]) -> Callable[[str], bool]:
+    """Build a model-name matcher for a fixed set of substring patterns."""
+
+    def matches(name: str) -> bool:
+        return any(map(name.lower().__contains__, patterns))
+
+    return matches
+
+
+# Matchers for the filtered endpoints, built once at import
+_PRO_MATCHER = _pattern_matcher(("gemini-3-pro-high", "gemini-3-pro-image", "gemini-3-pro-low"))
+_FLASH_MATCHER = _pattern_matcher(("gemini-3-flash",))
+_CLAUDE_MATCHER = _pattern_matcher(("claude-opus-4-5-thinking", "claude-sonnet-4-5", "claude-sonnet-4-5-thinking"))
+
+
+def filter_models(quota: dict, patterns: list[str] | Callable[[str], bool]) -> dict:
+    """Filter models by name patterns or a prebuilt matcher."""
+    matches = patterns if callable(patterns) else _pattern_matcher(tuple(patterns))
+    filtered = [m for m in quota["models"] if matches(m.name)]
     return {
         "models": filtered,
         "last_updated": quota["last_updated"],
@@ -105,24 +233,87 @@ def filter_models(quota: dict, patterns: list[str]) -> dict:
     }
 
 
-def _get_quota_data():
-    """Helper to load account and fetch quota."""
+async def _get_quota_data() -> tuple[dict, int]:
+    """Helper to load account and fetch quota with its fetch time."""
     try:
-        account = load_account()
+        # The shared lock may wait for another worker's write, so keep it off the event loop
+        account = await asyncio.to_thread(load_account)
     except FileNotFoundError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     try:
-        access_token = ensure_fresh_token(account)
+        access_token = await ensure_fresh_token(account)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     _, _, _, project_id = normalize_account(account)
 
     if not project_id:
-        project_id = get_project_id(access_token)
+        project_id = await get_project_id(access_token)
+
+    try:
+        return await get_quota(access_token, project_id)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 401:
+            raise
+        # Token was revoked or expired early: refresh once and retry
+        logger.info("Access token rejected, forcing refresh")
+        access_token = await ensure_fresh_token(account, force=True)
+        return await get_quota(access_token, project_id)
+
 
-    return get_quota(access_token, project_id)
+# Upstream data is reused for QUERY_DEBOUNCE minutes after it was fetched
+_RESPONSE_TTL = QUERY_DEBOUNCE * SECONDS_PER_MINUTE
+
+
+def _response_expiry(_key: str, entry: tuple[bytes, int], _now: float) -> float:
+    """Expire a cached response together with the upstream data it was built from."""
+    return entry[1] + _RESPONSE_TTL
+
+
+# Rendered JSON body and upstream fetch time per quota endpoint
+_response_cache: TLRUCache = TLRUCache(maxsize=32, ttu=_response_expiry, timer=time.time)
+# Last successful body per endpoint, served when the upstream query fails
+_stale_responses: dict[str, bytes] = {}
+_response_cache_lock = threading.Lock()
+
+
+def cached_response(endpoint: Callable) -> Callable:
+    """Cache an endpoint's rendered JSON and fall back to the last body on upstream errors.
+
+    The endpoint returns its content and the epoch second the upstream data was
+    fetched at; the body expires together with that data.
+    """
+    key = endpoint.__name__
+
+    @functools.wraps(endpoint)
+    async def wrapper():
+        with _response_cache_lock:
+            entry = _response_cache.get(key)
+
+        if entry is None:
+            try:
+                content, fetched_at = await endpoint()
+            except (HTTPException, httpx.HTTPError):
+                with _response_cache_lock:
+                    body = _stale_responses.get(key)
+                if body is None:
+                    raise
+                logger.warning("Upstream query failed, serving stale response for %s", key)
+                return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-cache"})
+
+            entry = (orjson.dumps(content), fetched_at)
+            with _response_cache_lock:
+                _response_cache[key] = entry
+                _stale_responses[key] = entry[0]
+
+        body, fetched_at = entry
+        max_age = max(0, int(fetched_at + _RESPONSE_TTL - time.time()))
+        return Response(
+            content=body, media_type="application/json", headers={"Cache-Control": f"public, max-age={max_age}"}
+        )
+
+    return wrapper
 
 
 @app.get("/quota")
@@ -150,7 +341,7 @@ async def get_quota_usage():
     return await get_quota_endpoints()
 
 
-def format_percentage_with_color(pct: int) -> str:
+def _format_percentage_with_color(pct: int) -> str:
     """Format percentage with ANSI color codes based on value."""
     # ANSI color codes
     GREEN = "\033[32m"
@@ -170,57 +361,68 @@ def format_percentage_with_color(pct: int) -> str:
         return f"{RED}●{RESET}"
 
 
+# Every 0-100 percentage pre-rendered at import
+_COLORED_PERCENTAGES: tuple[str, ...] = tuple(_format_percentage_with_color(pct) for pct in range(QUOTA_FULL + 1))
+
+
+def format_percentage_with_color(pct: int) -> str:
+    """Format percentage with ANSI color codes based on value."""
+    # GLM percentages can be fractional; only whole numbers are in the table
+    if type(pct) is int and 0 <= pct <= QUOTA_FULL:
+        return _COLORED_PERCENTAGES[pct]
+    return _format_percentage_with_color(pct)
+
+
 def format_time_compact(reset_time: str) -> str:
     """Calculate time remaining until reset in compact 'XhYm' format."""
-    try:
-        reset_dt = datetime.fromisoformat(reset_time.replace("Z", "+00:00"))
-        now = datetime.now(UTC)
-        delta = reset_dt - now
+    reset_ts = _reset_timestamp(reset_time)
+    if reset_ts is None:
+        return ""
+    remaining = reset_ts - time.time()
 
-        if delta.total_seconds() <= 0:
-            return ""
+    if remaining <= 0:
+        return ""
 
-        hours = int(delta.total_seconds() // 3600)
-        minutes = int((delta.total_seconds() % 3600) // 60)
+    hours, minutes = divmod(int(remaining) // 60, 60)
 
-        if hours == 0 and minutes == 0:
-            return ""
-        elif hours == 0:
-            return f"{minutes}m"
-        elif minutes == 0:
-            return f"{hours}h"
-        else:
-            return f"{hours}h{minutes}m"
-    except Exception:
+    if hours == 0 and minutes == 0:
         return ""
+    elif hours == 0:
+        return f"{minutes}m"
+    elif minutes == 0:
+        return f"{hours}h"
+    else:
+        return f"{hours}h{minutes}m"
 
 
 @app.get("/quota/overview")
+@cached_response
 async def get_quota_overview():
     """Get quick quota summary as string (e.g., 'Pro 95% | Flash 90% | Claude 80%')."""
-    quota_raw = _get_quota_data()
-    quota_formatted = format_quota(quota_raw, show_relative=False)
+    quota_raw, fetched_at = await _get_quota_data()
+    quota_formatted = format_quota(quota_raw, show_relative=False, last_updated=fetched_at)
 
     # Get Pro average (gemini-3-pro-high)
-    pro_models = [m for m in quota_formatted["models"] if "gemini-3-pro-high" in m["name"].lower()]
-    pro_pct = pro_models[0]["percentage"] if pro_models else 0
+    pro_models = [m for m in quota_formatted["models"] if "gemini-3-pro-high" in m.name.lower()]
+    pro_pct = pro_models[0].percentage if pro_models else 0
 
     # Get Flash (gemini-3-flash)
-    flash_models = [m for m in quota_formatted["models"] if "gemini-3-flash" in m["name"].lower()]
-    flash_pct = flash_models[0]["percentage"] if flash_models else 0
+    flash_models = [m for m in quota_formatted["models"] if "gemini-3-flash" in m.name.lower()]
+    flash_pct = flash_models[0].percentage if flash_models else 0
 
     # Get Claude average (claude-sonnet-4-5, non-thinking)
-    claude_models = [m for m in quota_formatted["models"] if m["name"].lower() == "claude-sonnet-4-5"]
-    claude_pct = claude_models[0]["percentage"] if claude_models else 0
+    claude_models = [m for m in quota_formatted["models"] if m.name.lower() == "claude-sonnet-4-5"]
+    claude_pct = claude_models[0].percentage if claude_models else 0
 
-    return {"overview": f"Pro {pro_pct}% | Flash {flash_pct}% | Claude {claude_pct}%"}
+    return {"overview": f"Pro {pro_pct}% | Flash {flash_pct}% | Claude {claude_pct}%"}, fetched_at
 
 
 @app.get("/quota/status")
+@cached_response
 async def get_quota_status():
     """Get terminal-friendly quota status with nerdfont symbols and colors."""
-    quota_raw = _get_quota_data()
-    quota_formatted = format_quota(quota_raw, show_relative=True)
+    quota_raw, fetched_at = await _get_quota_data()
+    quota_formatted = format_quota(quota_raw, show_relative=True, last_updated=fetched_at)
 
     # ANSI color codes
     GREEN = "\033[32m"
@@ -249,36 +451,37 @@ async def get_quota_status():
             return f"{icon} {pct_str}"
 
     # Get Pro (gemini-3-pro-high)
-    pro_models = [m for m in quota_formatted["models"] if "gemini-3-pro-high" in m["name"].lower()]
-    pro_pct = pro_models[0]["percentage"] if pro_models else 0
-    pro_reset = pro_models[0].get("reset_time", "") if pro_models else ""
+    pro_models = [m for m in quota_formatted["models"] if "gemini-3-pro-high" in m.name.lower()]
+    pro_pct = pro_models[0].percentage if pro_models else 0
+    pro_reset = pro_models[0].reset_time or "" if pro_models else ""
     pro_str = format_model_status(GEMINI_ICON, pro_pct, pro_reset)
 
     # Get Flash (gemini-3-flash)
-    flash_models = [m for m in quota_formatted["models"] if "gemini-3-flash" in m["name"].lower()]
-    flash_pct = flash_models[0]["percentage"] if flash_models else 0
-    flash_reset = flash_models[0].get("reset_time", "") if flash_models else ""
+    flash_models = [m for m in quota_formatted["models"] if "gemini-3-flash" in m.name.lower()]
+    flash_pct = flash_models[0].percentage if flash_models else 0
+    flash_reset = flash_models[0].reset_time or "" if flash_models else ""
     flash_str = format_model_status(FLASH_ICON, flash_pct, flash_reset)
 
     # Get Claude (claude-sonnet-4-5)
-    claude_models = [m for m in quota_formatted["models"] if m["name"].lower() == "claude-sonnet-4-5"]
-    claude_pct = claude_models[0]["percentage"] if claude_models else 0
-    claude_reset = claude_models[0].get("reset_time", "") if claude_models else ""
+    claude_models = [m for m in quota_formatted["models"] if m.name.lower() == "claude-sonnet-4-5"]
+    claude_pct = claude_models[0].percentage if claude_models else 0
+    claude_reset = claude_models[0].reset_time or "" if claude_models else ""
     claude_str = format_model_status(CLAUDE_ICON, claude_pct, claude_reset)
 
     overview = f"{pro_str} | {flash_str} | {claude_str}"
-    return {"overview": overview}
+    return {"overview": overview}, fetched_at
 
 
 @app.get("/quota/status-zai")
+@cached_response
 async def get_quota_status_zai():
     """Get terminal-friendly GLM quota status with nerdfont symbol and colors."""
     # Get GLM quota data
     quota_formatted = await get_glm_quota()
 
     # Get GLM token quota
-    glm_models = [m for m in quota_formatted["models"] if m["name"] == "glm"]
-    glm_pct = glm_models[0]["percentage"] if glm_models else 0
+    glm_models = [m for m in quota_formatted["models"] if m.name == "glm"]
+    glm_pct = glm_models[0].percentage if glm_models else 0
 
     # ANSI color codes
     GREEN = "\033[32m"
@@ -300,48 +503,51 @@ async def get_quota_status_zai():
         pct_str = format_percentage_with_color(glm_pct)
         status = f"{ZAI_ICON} {pct_str}"
 
-    return {"overview": status}
+    return {"overview": status}, quota_formatted["last_updated"]
 
 
 
 @app.get("/quota/all")
+@cached_response
 async def get_all_quota():
     """Get all models with relative reset time."""
-    quota_raw = _get_quota_data()
-    return {"quota": format_quota(quota_raw, show_relative=True)}
+    quota_raw, fetched_at = await _get_quota_data()
+    return {"quota": format_quota(quota_raw, show_relative=True, last_updated=fetched_at)}, fetched_at
 
 
 @app.get("/quota/pro")
+@cached_response
 async def get_gemini_3_pro():
     """Get Gemini 3 Pro models (high, image, low)."""
-    quota_raw = _get_quota_data()
-    quota_formatted = format_quota(quota_raw, show_relative=True)
-    filtered = filter_models(quota_formatted, ["gemini-3-pro-high", "gemini-3-pro-image", "gemini-3-pro-low"])
-    return {"quota": filtered}
+    quota_raw, fetched_at = await _get_quota_data()
+    quota_formatted = format_quota(quota_raw, show_relative=True, last_updated=fetched_at)
+    filtered = filter_models(quota_formatted, _PRO_MATCHER)
+    return {"quota": filtered}, fetched_at
 
 
 @app.get("/quota/flash")
+@cached_response
 async def get_gemini_3_flash():
     """Get Gemini 3 Flash model."""
-    quota_raw = _get_quota_data()
-    quota_formatted = format_quota(quota_raw, show_relative=True)
-    filtered = filter_models(quota_formatted, ["gemini-3-flash"])
-    return {"quota": filtered}
+    quota_raw, fetched_at = await _get_quota_data()
+    quota_formatted = format_quota(quota_raw, show_relative=True, last_updated=fetched_at)
+    filtered = filter_models(quota_formatted, _FLASH_MATCHER)
+    return {"quota": filtered}, fetched_at
 
 
 @app.get("/quota/claude")
+@cached_response
 async def get_claude_4_5():
     """Get Claude 4.5 models."""
-    quota_raw = _get_quota_data()
-    quota_formatted = format_quota(quota_raw, show_relative=True)
-    filtered = filter_models(
-        quota_formatted, ["claude-opus-4-5-thinking", "claude-sonnet-4-5", "claude-sonnet-4-5-thinking"]
-    )
-    return {"quota": filtered}
+    quota_raw, fetched_at = await _get_quota_data()
+    quota_formatted = format_quota(quota_raw, show_relative=True, last_updated=fetched_at)
+    filtered = filter_models(quota_formatted, _CLAUDE_MATCHER)
+    return {"quota": filtered}, fetched_at
 
 
 @app.get("/quota/glm")
+@cached_response
 async def get_glm_quota_endpoint():
     """Get GLM (Z.ai/ZHIPU) quota usage and limits."""
     quota_formatted = await get_glm_quota()
-    return {"quota": quota_formatted}
+    return {"quota": quota_formatted}, quota_formatted["last_updated"]
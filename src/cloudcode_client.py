@@ -1,12 +1,20 @@
 """Google Cloud Code API client for quota queries."""
 
-import json
+import asyncio
+import contextlib
+import fcntl
+import functools
+import hashlib
 import logging
+import os
+import stat
 import threading
 import time
+from collections.abc import AsyncIterator
 from datetime import datetime
 
 import httpx
+import orjson
 from cachetools import TTLCache
 
 from .config import (
@@ -20,16 +28,63 @@ from .config import (
     USER_AGENT,
 )
 from .constants import SECONDS_PER_MINUTE, TOKEN_REFRESH_BUFFER_SECONDS
+from .http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
 
+def _lock_account_file(operation: int) -> int | None:
+    """Open ACCOUNT_FILE and flock it, returning the fd or None if the file is missing.
+
+    Retries when the file was replaced while waiting, so the lock always covers the
+    file currently at ACCOUNT_FILE. Closing the fd releases the lock.
+    """
+    while True:
+        try:
+            fd = os.open(ACCOUNT_FILE, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, operation)
+            if os.fstat(fd).st_ino == os.stat(ACCOUNT_FILE).st_ino:
+                return fd
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+
 def load_account() -> dict:
-    """Load account from file."""
-    if not ACCOUNT_FILE.exists():
+    """Load account from file.
+
+    Holds a shared lock while reading, so an in-place write by another worker is
+    never seen half done.
+    """
+    fd = _lock_account_file(fcntl.LOCK_SH)
+    if fd is None:
         raise FileNotFoundError(f"Account file not found: {ACCOUNT_FILE}")
-    with open(ACCOUNT_FILE) as f:
-        return json.load(f)
+    # Read the raw bytes with a single read() and no text decoding layer
+    try:
+        data = os.read(fd, os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
+    return orjson.loads(data)
+
+
+@functools.lru_cache(maxsize=32)
+def _normalize_flat(
+    access_token: str | None,
+    refresh_token: str | None,
+    project_id: str | None,
+    has_timestamp: bool,
+    timestamp_ms: int | None,
+    expires_in: int,
+    expiry_timestamp: int | None,
+) -> tuple[str, str, int | None, str | None]:
+    """Normalize the flat account format from its extracted fields."""
+    if has_timestamp:
+        expiry_timestamp = (timestamp_ms // 1000) + expires_in if timestamp_ms else None
+    return access_token, refresh_token, expiry_timestamp, project_id
 
 
 def normalize_account(account: dict) -> tuple[str, str, int | None, str | None]:
@@ -43,23 +98,18 @@ def normalize_account(account: dict) -> tuple[str, str, int | None, str | None]:
             token_data.get("project_id"),
         )
 
-    access_token = account.get("access_token")
-    refresh_token = account.get("refresh_token")
-    project_id = account.get("project_id")
+    return _normalize_flat(
+        account.get("access_token"),
+        account.get("refresh_token"),
+        account.get("project_id"),
+        "timestamp" in account,
+        account.get("timestamp"),
+        account.get("expires_in", 3600),
+        account.get("expiry_timestamp"),
+    )
 
-    expiry_timestamp = None
-    if "timestamp" in account:
-        timestamp_ms = account.get("timestamp")
-        if timestamp_ms:
-            expires_in = account.get("expires_in", 3600)
-            expiry_timestamp = (timestamp_ms // 1000) + expires_in
-    elif "expiry_timestamp" in account:
-        expiry_timestamp = account.get("expiry_timestamp")
-
-    return access_token, refresh_token, expiry_timestamp, project_id
 
-
-def refresh_access_token(refresh_token: str) -> dict:
+async def refresh_access_token(refresh_token: str) -> dict:
     """Refresh access token using refresh_token."""
     data = {
         "client_id": CLIENT_ID,
@@ -67,59 +117,184 @@ def refresh_access_token(refresh_token: str) -> dict:
         "refresh_token": refresh_token,
         "grant_type": "refresh_token",
     }
-    response = httpx.post(TOKEN_URL, data=data)
+    response = await get_http_client().post(TOKEN_URL, data=data)
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
+
+
+# Latest refreshed (access_token, expiry_timestamp) per refresh_token, so
+# concurrent requests holding the same stale account share one refresh
+_refreshed_tokens: dict[str, tuple[str, int]] = {}
+_token_refresh_lock = asyncio.Lock()
+
+# How often to retry while another worker holds the account file lock
+_ACCOUNT_LOCK_POLL_SECONDS = 0.05
+
+
+@contextlib.asynccontextmanager
+async def _exclusive_account_lock() -> AsyncIterator[int | None]:
+    """Hold an exclusive flock on ACCOUNT_FILE across gunicorn workers.
+
+    Polls instead of blocking so the event loop keeps serving while another worker
+    refreshes. Yields the locked fd, or None if the file does not exist.
+    """
+    while True:
+        try:
+            fd = _lock_account_file(fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            await asyncio.sleep(_ACCOUNT_LOCK_POLL_SECONDS)
+    try:
+        yield fd
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def _read_locked_account(fd: int) -> dict | None:
+    """Read the account through an already locked fd, or None if it cannot be parsed."""
+    try:
+        return orjson.loads(os.pread(fd, os.fstat(fd).st_size, 0))
+    except orjson.JSONDecodeError:
+        return None
 
 
-def ensure_fresh_token(account: dict) -> str:
-    """Check token expiry and refresh if needed (within 5 minutes)."""
+# Digest of the last account JSON written, to skip rewriting identical content
+_last_written_hash: bytes | None = None
+
+
+def _write_fd(fd: int, data: bytes) -> None:
+    """Write all of data to fd and close it."""
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view) :]
+    finally:
+        os.close(fd)
+
+
+def save_account(account: dict) -> None:
+    """Atomically write the account back to ACCOUNT_FILE after a token refresh.
+
+    Writes to a per-process temp file with the account file's permissions and renames
+    it over ACCOUNT_FILE, so other workers never read a partially written file. Falls
+    back to overwriting in place when the rename is not possible; callers hold the
+    exclusive account lock so readers wait for that write. Unchanged content is not
+    rewritten.
+    """
+    global _last_written_hash
+    data = orjson.dumps(account, option=orjson.OPT_INDENT_2)
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if digest == _last_written_hash:
+        logger.info("Account file already up to date, skipping write")
+        return
+
+    # Keep the refresh token as private as the original file (owner-only by default)
+    try:
+        mode = stat.S_IMODE(os.stat(ACCOUNT_FILE).st_mode)
+    except OSError:
+        mode = 0o600
+
+    tmp_file = ACCOUNT_FILE.with_suffix(f".tmp.{os.getpid()}")
+    try:
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        os.fchmod(fd, mode)
+        _write_fd(fd, data)
+        os.replace(tmp_file, ACCOUNT_FILE)
+    except OSError as e:
+        with contextlib.suppress(OSError):
+            tmp_file.unlink(missing_ok=True)
+        # Read-only directory or a single-file bind mount (EBUSY): overwrite in place
+        logger.info("Could not replace %s atomically (%s), writing in place", ACCOUNT_FILE, e)
+        try:
+            _write_fd(os.open(ACCOUNT_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode), data)
+        except OSError as e:
+            logger.error("Failed to save refreshed token to %s: %s", ACCOUNT_FILE, e)
+            return
+    _last_written_hash = digest
+
+
+async def ensure_fresh_token(account: dict, force: bool = False) -> str:
+    """Check token expiry and refresh if needed (within 5 minutes).
+
+    Set force to refresh regardless of expiry, e.g. after the API rejected the token.
+    """
     access_token, refresh_token, expiry_timestamp, _ = normalize_account(account)
 
     if not access_token or not refresh_token:
         raise ValueError("Missing access_token or refresh_token")
 
     now = int(time.time())
-    if expiry_timestamp and expiry_timestamp > now + TOKEN_REFRESH_BUFFER_SECONDS:
+    if not force and expiry_timestamp and expiry_timestamp > now + TOKEN_REFRESH_BUFFER_SECONDS:
         logger.info("Token is fresh, no need to refresh")
         return access_token
 
-    # Token needs refresh
-    logger.info("Token needs refresh")
-    new_token_data = refresh_access_token(refresh_token)
-    new_expiry = now + new_token_data["expires_in"]
-
-    # Update account dict
-    if "token" in account:
-        token_data = account["token"]
-        token_data["access_token"] = new_token_data["access_token"]
-        token_data["expires_in"] = new_token_data["expires_in"]
-        token_data["expiry_timestamp"] = new_expiry
-        token_data["token_type"] = new_token_data.get("token_type", "Bearer")
-    else:
-        account["access_token"] = new_token_data["access_token"]
-        account["expires_in"] = new_token_data["expires_in"]
-        account["timestamp"] = now * 1000
-        account["type"] = "antigravity"
-
-    # Update top-level access_token and expired fields
-    # expired is ISO 8601 datetime with local timezone
-    expiry_dt = datetime.fromtimestamp(new_expiry).astimezone()
-    account["access_token"] = new_token_data["access_token"]
-    account["expired"] = expiry_dt.isoformat()
-
-    # Write updated account back to file
-    try:
-        with open(ACCOUNT_FILE, "w") as f:
-            json.dump(account, f, indent=2)
-        logger.info("Access token refreshed, expires at %s", expiry_dt.isoformat())
-    except (IOError, OSError) as e:
-        logger.error("Failed to save refreshed token to %s: %s", ACCOUNT_FILE, e)
+    async with _token_refresh_lock:
+        # Another request may have refreshed this token while we waited. A forced
+        # refresh skips this: the shared token may be the one that was rejected
+        now = int(time.time())
+        refreshed = _refreshed_tokens.get(refresh_token)
+        if (
+            not force
+            and refreshed
+            and refreshed[0] != access_token
+            and refreshed[1] > now + TOKEN_REFRESH_BUFFER_SECONDS
+        ):
+            logger.info("Using token refreshed by a concurrent request")
+            return refreshed[0]
+
+        # Serialize refreshes and account writes across gunicorn workers
+        async with _exclusive_account_lock() as lock_fd:
+            # Another worker may have refreshed and saved the token while we waited
+            now = int(time.time())
+            stored = _read_locked_account(lock_fd) if lock_fd is not None and not force else None
+            if stored is not None:
+                stored_access, stored_refresh, stored_expiry, _ = normalize_account(stored)
+                if (
+                    stored_refresh == refresh_token
+                    and stored_access != access_token
+                    and stored_expiry
+                    and stored_expiry > now + TOKEN_REFRESH_BUFFER_SECONDS
+                ):
+                    logger.info("Using token refreshed by another worker")
+                    account.clear()
+                    account.update(stored)
+                    _refreshed_tokens[refresh_token] = (stored_access, stored_expiry)
+                    return stored_access
+
+            # Token needs refresh
+            logger.info("Token needs refresh")
+            new_token_data = await refresh_access_token(refresh_token)
+            new_expiry = now + new_token_data["expires_in"]
+            _refreshed_tokens[refresh_token] = (new_token_data["access_token"], new_expiry)
+
+            # Update account dict
+            if "token" in account:
+                token_data = account["token"]
+                token_data["access_token"] = new_token_data["access_token"]
+                token_data["expires_in"] = new_token_data["expires_in"]
+                token_data["expiry_timestamp"] = new_expiry
+                token_data["token_type"] = new_token_data.get("token_type", "Bearer")
+            else:
+                account["access_token"] = new_token_data["access_token"]
+                account["expires_in"] = new_token_data["expires_in"]
+                account["timestamp"] = now * 1000
+                account["type"] = "antigravity"
+
+            # Update top-level access_token and expired fields
+            # expired is ISO 8601 datetime with local timezone
+            expiry_dt = datetime.fromtimestamp(new_expiry).astimezone()
+            account["access_token"] = new_token_data["access_token"]
+            account["expired"] = expiry_dt.isoformat()
+
+            # Write updated account back to file
+            save_account(account)
+            logger.info("Access token refreshed, expires at %s", expiry_dt.isoformat())
 
     return new_token_data["access_token"]
 
 
-def get_project_id(access_token: str) -> str | None:
+async def get_project_id(access_token: str) -> str | None:
     """Fetch the project ID from the CloudCode API."""
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -129,9 +304,9 @@ def get_project_id(access_token: str) -> str | None:
     payload = {"metadata": {"ideType": "ANTIGRAVITY"}}
 
     try:
-        response = httpx.post(PROJECT_API_URL, headers=headers, json=payload)
+        response = await get_http_client().post(PROJECT_API_URL, headers=headers, json=payload)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             return data.get("cloudaicompanionProject")
         logger.warning("Failed to get project ID: HTTP %d", response.status_code)
     except httpx.RequestError as e:
@@ -146,8 +321,11 @@ _quota_cache: TTLCache = TTLCache(maxsize=1, ttl=QUERY_DEBOUNCE * SECONDS_PER_MI
 _quota_cache_lock = threading.Lock()
 
 
-def get_quota(access_token: str, project_id: str | None = None) -> dict:
-    """Fetch quota information from the CloudCode API with caching."""
+async def get_quota(access_token: str, project_id: str | None = None) -> tuple[dict, int]:
+    """Fetch quota information from the CloudCode API with caching.
+
+    Returns the quota data and the epoch second it was fetched at.
+    """
     cache_key = "quota"
 
     # Thread-safe cache check
@@ -167,9 +345,9 @@ def get_quota(access_token: str, project_id: str | None = None) -> dict:
     if project_id:
         payload["project"] = project_id
 
-    response = httpx.post(API_URL, headers=headers, json=payload)
+    response = await get_http_client().post(API_URL, headers=headers, json=payload)
     response.raise_for_status()
-    result = response.json()
+    result = (orjson.loads(response.content), int(time.time()))
 
     # Thread-safe cache update
     with _quota_cache_lock:
@@ -1,51 +1,89 @@
 """Configuration and environment variables."""
 
+import functools
 import logging
 import os
+from dataclasses import dataclass
 from pathlib import Path
 
 from dotenv import load_dotenv
 
 from .constants import DEFAULT_ZAI_BASE_URL
 
-logger = logging.getLogger(__name__)
+__all__ = [
+    "ACCOUNT_FILE",
+    "API_URL",
+    "CLIENT_ID",
+    "CLIENT_SECRET",
+    "PORT",
+    "PROJECT_API_URL",
+    "QUERY_DEBOUNCE",
+    "TOKEN_URL",
+    "USER_AGENT",
+]
 
-# Load environment variables from .env file
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Google Cloud Code API URLs
 API_URL = "https://cloudcode-pa.googleapis.com/v1internal:fetchAvailableModels"
 PROJECT_API_URL = "https://cloudcode-pa.googleapis.com/v1internal:loadCodeAssist"
 TOKEN_URL = "https://oauth2.googleapis.com/token"
 
-# User agent (loaded from .env)
-USER_AGENT = os.getenv("USER_AGENT", "antigravity/1.13.3 Darwin/arm64")
-
-# Google OAuth credentials (loaded from .env)
-# https://github.com/lbjlaq/Antigravity-Manager/blob/main/src-tauri/src/modules/oauth.rs
-CLIENT_ID = os.getenv("CLIENT_ID", "")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET", "")
-
-# Account file path (loaded from .env)
-# Resolve relative paths against the project root (parent of src/)
-_account_file_value = os.getenv("ACCOUNT_FILE", "antigravity.json").strip("'\"")
-_account_file_path = Path(_account_file_value)
-if not _account_file_path.is_absolute():
-    _account_file_path = Path(__file__).parent.parent / _account_file_path
-ACCOUNT_FILE = _account_file_path
-logger.info(f"ACCOUNT_FILE: {ACCOUNT_FILE}")
-
-# Server port (loaded from .env)
-PORT = int(os.getenv("PORT", "8000"))
-
-# Query debounce time in minutes (loaded from .env)
-# Cache googleapis responses for this many minutes to avoid spamming
-QUERY_DEBOUNCE = int(os.getenv("QUERY_DEBOUNCE", "1"))
-
-# Map ZAI_ prefixed variables to ANTHROPIC_ for z.ai queries
-if os.getenv("ZAI_ANTHROPIC_AUTH_TOKEN"):
-    os.environ["ANTHROPIC_AUTH_TOKEN"] = os.getenv("ZAI_ANTHROPIC_AUTH_TOKEN")
-if os.getenv("ZAI_ANTHROPIC_BASE_URL"):
-    os.environ["ANTHROPIC_BASE_URL"] = os.getenv("ZAI_ANTHROPIC_BASE_URL")
-else:
-    os.environ["ANTHROPIC_BASE_URL"] = DEFAULT_ZAI_BASE_URL
+
+@dataclass(frozen=True)
+class _Config:
+    """Settings resolved from the environment and .env file."""
+
+    user_agent: str
+    client_id: str
+    client_secret: str
+    account_file: Path
+    port: int
+    query_debounce: int
+
+
+@functools.cache
+def _cfg() -> _Config:
+    """Load .env and parse environment variables once per process."""
+    # Load environment variables from .env file
+    load_dotenv()
+
+    # Account file path
+    # Resolve relative paths against the project root (parent of src/)
+    account_file_value = os.getenv("ACCOUNT_FILE", "antigravity.json").strip("'\"")
+    account_file_path = Path(account_file_value)
+    if not account_file_path.is_absolute():
+        account_file_path = Path(__file__).parent.parent / account_file_path
+    logger.info(f"ACCOUNT_FILE: {account_file_path}")
+
+    # Map ZAI_ prefixed variables to ANTHROPIC_ for z.ai queries
+    if os.getenv("ZAI_ANTHROPIC_AUTH_TOKEN"):
+        os.environ["ANTHROPIC_AUTH_TOKEN"] = os.getenv("ZAI_ANTHROPIC_AUTH_TOKEN")
+    if os.getenv("ZAI_ANTHROPIC_BASE_URL"):
+        os.environ["ANTHROPIC_BASE_URL"] = os.getenv("ZAI_ANTHROPIC_BASE_URL")
+    else:
+        os.environ["ANTHROPIC_BASE_URL"] = DEFAULT_ZAI_BASE_URL
+
+    return _Config(
+        # User agent
+        user_agent=os.getenv("USER_AGENT", "antigravity/1.13.3 Darwin/arm64"),
+        # Google OAuth credentials
+        # https://github.com/lbjlaq/Antigravity-Manager/blob/main/src-tauri/src/modules/oauth.rs
+        client_id=os.getenv("CLIENT_ID", ""),
+        client_secret=os.getenv("CLIENT_SECRET", ""),
+        account_file=account_file_path,
+        # Server port
+        port=int(os.getenv("PORT", "8000")),
+        # Query debounce time in minutes
+        # Cache googleapis responses for this many minutes to avoid spamming
+        query_debounce=int(os.getenv("QUERY_DEBOUNCE", "1")),
+    )
+
+
+# Module-level names kept for existing imports (loaded from .env)
+USER_AGENT = _cfg().user_agent
+CLIENT_ID = _cfg().client_id
+CLIENT_SECRET = _cfg().client_secret
+ACCOUNT_FILE = _cfg().account_file
+PORT = _cfg().port
+QUERY_DEBOUNCE = _cfg().query_debounce
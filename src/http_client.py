@@ -0,0 +1,25 @@
+"""Shared async HTTP client for upstream API calls."""
+
+import httpx
+
+# Keep-alive pool shared by the googleapis and z.ai clients
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+HTTP_TIMEOUT = 10.0
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP/2 client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared client and release pooled connections."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
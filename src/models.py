@@ -0,0 +1,25 @@
+"""Model quota entries returned by the API.
+
+Slotted, frozen dataclasses keep per-model allocations small; orjson and
+FastAPI serialize them to the same JSON objects as plain dicts.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class QuotaModel:
+    """Remaining quota of an Antigravity (Gemini/Claude) model."""
+
+    name: str
+    percentage: int
+    reset_time: str | None = None
+    reset_time_relative: str | None = None
+
+
+@dataclass(slots=True, frozen=True)
+class GlmModel:
+    """Remaining quota of a GLM (Z.ai/ZHIPU) limit or MCP tool."""
+
+    name: str
+    percentage: int
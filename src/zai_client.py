@@ -8,10 +8,13 @@ from datetime import UTC, datetime
 from urllib.parse import quote, urlparse
 
 import httpx
+import orjson
 from cachetools import TTLCache
 from fastapi import HTTPException
 
 from .config import QUERY_DEBOUNCE
+from .http_client import get_http_client
+from .models import GlmModel
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +23,15 @@ SECONDS_PER_MINUTE = 60
 _zai_cache: TTLCache = TTLCache(maxsize=10, ttl=QUERY_DEBOUNCE * SECONDS_PER_MINUTE)
 _zai_cache_lock = threading.Lock()
 
+# MCP tools left out of the GLM quota models
+_EXCLUDED_TOOLS = frozenset({"zread"})
 
-async def query_zai_endpoint(url: str, auth_token: str, query_params: str = "") -> dict:
-    """Query a Z.ai API endpoint and return JSON response with caching."""
+
+async def query_zai_endpoint(url: str, auth_token: str, query_params: str = "") -> tuple[dict, int]:
+    """Query a Z.ai API endpoint and return JSON response with caching.
+
+    Returns the response data and the epoch second it was fetched at.
+    """
     cache_key = f"{url}{query_params}"
 
     # Check cache first
@@ -37,23 +46,22 @@ async def query_zai_endpoint(url: str, auth_token: str, query_params: str = "")
         "Content-Type": "application/json",
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url + query_params, headers=headers, timeout=10.0)
-            response.raise_for_status()
-            json_data = response.json()
-            result = json_data.get("data", json_data)
+    try:
+        response = await get_http_client().get(url + query_params, headers=headers)
+        response.raise_for_status()
+        json_data = orjson.loads(response.content)
+        result = (json_data.get("data", json_data), int(time.time()))
 
-            # Cache the result
-            with _zai_cache_lock:
-                _zai_cache[cache_key] = result
-            logger.info("Cached z.ai data for %d minute(s)", QUERY_DEBOUNCE)
+        # Cache the result
+        with _zai_cache_lock:
+            _zai_cache[cache_key] = result
+        logger.info("Cached z.ai data for %d minute(s)", QUERY_DEBOUNCE)
 
-            return result
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail=f"Z.ai API error: {e.response.text}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to query Z.ai API: {e!s}")
+        return result
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"Z.ai API error: {e.response.text}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to query Z.ai API: {e!s}")
 
 
 def get_base_domain(base_url: str) -> tuple[str, str]:
@@ -125,14 +133,14 @@ def format_glm_quota(quota_limit_data: dict) -> dict:
 
         if limit_type == "Token usage(5 Hour)":
             # Token limit: show remaining percentage (100 - used)
-            models.append({"name": "glm", "percentage": 100 - percentage})
+            models.append(GlmModel("glm", 100 - percentage))
         elif limit_type == "MCP usage(1 Month)":
             # MCP limit: show remaining percentage
             total = limit.get("total", 100)
             usage_details = limit.get("usageDetails", [])
 
             # Add overall MCP quota
-            models.append({"name": "glm-coding-plan-mcp-monthly", "percentage": 100 - percentage})
+            models.append(GlmModel("glm-coding-plan-mcp-monthly", 100 - percentage))
 
             # Add individual tool usage details (excluding zread)
             for detail in usage_details:
@@ -140,11 +148,11 @@ def format_glm_quota(quota_limit_data: dict) -> dict:
                 usage = detail.get("usage", 0)
 
                 # Skip zread
-                if model_code == "zread":
+                if model_code in _EXCLUDED_TOOLS:
                     continue
 
                 tool_percentage = int(usage / total * 100) if total > 0 else 0
-                models.append({"name": f"glm-coding-plan-{model_code}", "percentage": 100 - tool_percentage})
+                models.append(GlmModel(f"glm-coding-plan-{model_code}", 100 - tool_percentage))
 
     return {
         "models": models,
@@ -153,6 +161,40 @@ def format_glm_quota(quota_limit_data: dict) -> dict:
     }
 
 
+def format_glm_quota_from_raw(data: dict, last_updated: int | None = None) -> dict:
+    """Format raw quota limit data in a single pass.
+
+    Equivalent to format_glm_quota(process_quota_limit(data)) without building
+    the intermediate limit dicts. last_updated defaults to the current time.
+    """
+    models = []
+
+    for item in (data or {}).get("limits", ()):
+        limit_type = item.get("type")
+        percentage = item.get("percentage") or 0
+
+        if limit_type == "TOKENS_LIMIT":
+            # Token limit: show remaining percentage (100 - used)
+            models.append(GlmModel("glm", 100 - percentage))
+        elif limit_type == "TIME_LIMIT":
+            # MCP limit: overall quota, then individual tools
+            total = item.get("usage") or 0
+            models.append(GlmModel("glm-coding-plan-mcp-monthly", 100 - percentage))
+
+            for detail in item.get("usageDetails") or ():
+                model_code = detail.get("modelCode", "")
+                if model_code in _EXCLUDED_TOOLS:
+                    continue
+                tool_percentage = int(detail.get("usage", 0) / total * 100) if total > 0 else 0
+                models.append(GlmModel(f"glm-coding-plan-{model_code}", 100 - tool_percentage))
+
+    return {
+        "models": models,
+        "last_updated": int(time.time()) if last_updated is None else last_updated,
+        "is_forbidden": False,
+    }
+
+
 async def get_glm_quota() -> dict:
     """Get GLM quota data from Z.ai/ZHIPU API."""
     # Read environment variables
@@ -174,8 +216,7 @@ async def get_glm_quota() -> dict:
 
     # Query quota limit endpoint
     quota_limit_url = f"{base_domain}/api/monitor/usage/quota/limit"
-    quota_limit_raw = await query_zai_endpoint(quota_limit_url, auth_token)
-    quota_limit_processed = process_quota_limit(quota_limit_raw)
+    quota_limit_raw, fetched_at = await query_zai_endpoint(quota_limit_url, auth_token)
 
     # Format to match antigravity quota format
-    return format_glm_quota(quota_limit_processed)
+    return format_glm_quota_from_raw(quota_limit_raw, last_updated=fetched_at)
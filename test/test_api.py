@@ -1,13 +1,18 @@
 """Tests for src.api module."""
 
+import asyncio
 import time
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
+import httpx
 import pytest
-from fastapi.testclient import TestClient
+import pytest_asyncio
+from fastapi import HTTPException
 
+import src.api
 from src.api import (
+    _pattern_matcher,
     app,
     filter_models,
     format_percentage_with_color,
@@ -15,6 +20,14 @@ from src.api import (
     format_time_compact,
     format_time_remaining,
 )
+from src.models import QuotaModel
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Start every test with an empty endpoint response cache."""
+    src.api._response_cache.clear()
+    src.api._stale_responses.clear()
 
 
 class TestFormatTimeRemaining:
@@ -46,6 +59,31 @@ class TestFormatTimeRemaining:
         result = format_time_remaining("invalid-time")
         assert result == ""
 
+    def test_malformed_z_time_returns_empty(self):
+        """Test that a Z-suffixed string with bad fields returns empty string."""
+        assert format_time_remaining("2025-13-01T00:00:00Z") == ""
+        assert format_time_remaining("2025-1a-01T00:00:00Z") == ""
+        assert format_time_remaining("2025-0a-01T00:00:00Z") == ""
+        assert format_time_remaining("2025-01-0²T00:00:00Z") == ""
+
+    def test_out_of_range_z_time_returns_empty(self):
+        """Test that a Z-suffixed string with out-of-range fields returns empty string."""
+        assert format_time_remaining("2030-01-32T00:00:00Z") == ""
+        assert format_time_remaining("2030-02-30T00:00:00Z") == ""
+        assert format_time_remaining("2030-01-01T99:00:00Z") == ""
+        assert format_time_remaining("2030-01-01T00:60:00Z") == ""
+        assert format_time_remaining("2030-01-01T00:00:60Z") == ""
+        assert format_time_remaining("0000-01-01T00:00:00Z") == ""
+
+    def test_leap_day_z_time(self):
+        """Test that Feb 29 of a leap year is accepted."""
+        assert format_time_remaining("2096-02-29T00:00:00Z") != ""
+
+    def test_time_without_timezone_returns_empty(self):
+        """Test that a reset time without timezone returns empty string."""
+        result = format_time_remaining("2025-12-26T00:00:00")
+        assert result == ""
+
 
 class TestFormatTimeCompact:
     """Tests for format_time_compact function."""
@@ -79,6 +117,11 @@ class TestFormatTimeCompact:
         result = format_time_compact("invalid-time")
         assert result == ""
 
+    def test_malformed_z_time_returns_empty(self):
+        """Test that a Z-suffixed string with non-digit fields returns empty string."""
+        assert format_time_compact("2025-0a-01T00:00:00Z") == ""
+        assert format_time_compact("2025-01-0²T00:00:00Z") == ""
+
 
 class TestFormatPercentageWithColor:
     """Tests for format_percentage_with_color function."""
@@ -119,6 +162,11 @@ class TestFormatPercentageWithColor:
             result = format_percentage_with_color(pct)
             assert result == f"{self.RED}{pct}%{self.RESET}"
 
+    def test_fractional_percentage(self):
+        """Test fractional percentages, e.g. from GLM, are formatted as before."""
+        assert format_percentage_with_color(87.5) == f"{self.GREEN}87.5%{self.RESET}"
+        assert format_percentage_with_color(100.0) == f"{self.GREEN}●{self.RESET}"
+
 
 class TestFormatQuota:
     """Tests for format_quota function."""
@@ -144,10 +192,10 @@ class TestFormatQuota:
         result = format_quota(quota_data, show_relative=False)
 
         assert len(result["models"]) == 2
-        assert result["models"][0]["name"] == "gemini-3-flash"
-        assert result["models"][0]["percentage"] == 100
-        assert result["models"][1]["name"] == "gemini-3-pro-high"
-        assert result["models"][1]["percentage"] == 85
+        assert result["models"][0].name == "gemini-3-flash"
+        assert result["models"][0].percentage == 100
+        assert result["models"][1].name == "gemini-3-pro-high"
+        assert result["models"][1].percentage == 85
         assert result["is_forbidden"] is False
 
     def test_format_claude_models(self):
@@ -165,8 +213,8 @@ class TestFormatQuota:
         result = format_quota(quota_data, show_relative=False)
 
         assert len(result["models"]) == 1
-        assert result["models"][0]["name"] == "claude-sonnet-4-5"
-        assert result["models"][0]["percentage"] == 50
+        assert result["models"][0].name == "claude-sonnet-4-5"
+        assert result["models"][0].percentage == 50
 
     def test_filters_non_gemini_claude_models(self):
         """Test that non-Gemini/Claude models are filtered out."""
@@ -183,6 +231,12 @@ class TestFormatQuota:
         result = format_quota(quota_data, show_relative=False)
         assert len(result["models"]) == 0
 
+    def test_keeps_models_with_family_inside_name(self):
+        """Test that models are matched by family anywhere in the name, not only as a prefix."""
+        quota_data = {"models": {"vertex-claude-opus-4-5": {"quotaInfo": {"remainingFraction": 0.25}}}}
+        result = format_quota(quota_data, show_relative=False)
+        assert [m.name for m in result["models"]] == ["vertex-claude-opus-4-5"]
+
     def test_empty_models(self):
         """Test handling empty models dict."""
         quota_data = {"models": {}}
@@ -198,25 +252,25 @@ class TestFilterModels:
         """Test filtering models by pattern."""
         quota = {
             "models": [
-                {"name": "gemini-3-pro-high", "percentage": 100},
-                {"name": "gemini-3-pro-low", "percentage": 90},
-                {"name": "gemini-3-flash", "percentage": 80},
-                {"name": "claude-sonnet-4-5", "percentage": 70},
+                QuotaModel("gemini-3-pro-high", 100),
+                QuotaModel("gemini-3-pro-low", 90),
+                QuotaModel("gemini-3-flash", 80),
+                QuotaModel("claude-sonnet-4-5", 70),
             ],
             "last_updated": 123456,
             "is_forbidden": False,
         }
         result = filter_models(quota, ["gemini-3-pro"])
         assert len(result["models"]) == 2
-        assert all("gemini-3-pro" in m["name"] for m in result["models"])
+        assert all("gemini-3-pro" in m.name for m in result["models"])
         assert result["last_updated"] == 123456
 
     def test_filter_multiple_patterns(self):
         """Test filtering with multiple patterns."""
         quota = {
             "models": [
-                {"name": "gemini-3-pro-high", "percentage": 100},
-                {"name": "claude-sonnet-4-5", "percentage": 70},
+                QuotaModel("gemini-3-pro-high", 100),
+                QuotaModel("claude-sonnet-4-5", 70),
             ],
             "last_updated": 123456,
             "is_forbidden": False,
@@ -227,21 +281,119 @@ class TestFilterModels:
     def test_filter_no_matches(self):
         """Test filtering with no matches."""
         quota = {
-            "models": [{"name": "gemini-3-pro-high", "percentage": 100}],
+            "models": [QuotaModel("gemini-3-pro-high", 100)],
             "last_updated": 123456,
             "is_forbidden": False,
         }
         result = filter_models(quota, ["nonexistent"])
         assert len(result["models"]) == 0
 
+    def test_filter_with_prebuilt_matcher(self):
+        """Test filtering with a matcher built by _pattern_matcher."""
+        quota = {
+            "models": [
+                QuotaModel("gemini-3-flash", 80),
+                QuotaModel("claude-sonnet-4-5", 70),
+            ],
+            "last_updated": 123456,
+            "is_forbidden": False,
+        }
+        result = filter_models(quota, _pattern_matcher(("gemini-3-flash",)))
+        assert [m.name for m in result["models"]] == ["gemini-3-flash"]
+
+
+class TestGetQuotaData:
+    """Tests for _get_quota_data helper."""
+
+    @pytest.mark.asyncio
+    @patch("src.api.get_quota")
+    @patch("src.api.ensure_fresh_token")
+    @patch("src.api.load_account")
+    async def test_rejected_token_is_refreshed_and_retried(self, mock_load, mock_token, mock_get_quota):
+        """Test a 401 from the quota API forces a token refresh and one retry."""
+        account = {"access_token": "old_access", "refresh_token": "refresh456", "project_id": "project-123"}
+        mock_load.return_value = account
+        mock_token.side_effect = ["old_access", "new_access"]
+        unauthorized = httpx.Response(401, request=httpx.Request("POST", "https://example.com"))
+        mock_get_quota.side_effect = [
+            httpx.HTTPStatusError("Unauthorized", request=unauthorized.request, response=unauthorized),
+            ({"models": {}}, 123456),
+        ]
+
+        result = await src.api._get_quota_data()
+
+        assert result == ({"models": {}}, 123456)
+        mock_token.assert_called_with(account, force=True)
+        mock_get_quota.assert_called_with("new_access", "project-123")
+
+
+async def _wait_until(condition, timeout: float = 1.0) -> None:
+    """Yield to the event loop until condition() holds, failing after timeout seconds."""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@patch("src.api.close_http_client")
+@patch("src.api.get_http_client")
+class TestLifespan:
+    """Tests for the application lifespan."""
+
+    @pytest.mark.asyncio
+    @patch("src.api._get_quota_data")
+    async def test_startup_primes_response_cache(self, mock_get_quota, mock_get_client, mock_close):
+        """Test startup fetches quota once and caches the /quota/all response."""
+        mock_get_quota.return_value = ({"models": {}}, int(time.time()))
+
+        async with src.api.lifespan(app):
+            await _wait_until(lambda: "get_all_quota" in src.api._response_cache)
+
+        mock_get_client.assert_called_once()
+        mock_get_quota.assert_called_once()
+        mock_close.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("src.api._get_quota_data")
+    async def test_startup_survives_prime_failure(self, mock_get_quota, mock_get_client, mock_close):
+        """Test startup continues when the quota cache cannot be primed."""
+        mock_get_quota.side_effect = HTTPException(status_code=500, detail="Account file not found")
+
+        async with src.api.lifespan(app):
+            await _wait_until(lambda: mock_get_quota.called)
+            assert "get_all_quota" not in src.api._response_cache
+
+        mock_close.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("src.api._get_quota_data")
+    async def test_startup_does_not_wait_for_upstream(self, mock_get_quota, mock_get_client, mock_close):
+        """Test serving starts while priming is pending and shutdown cancels it."""
+        mock_get_quota.side_effect = asyncio.Event().wait
+
+        async with src.api.lifespan(app):
+            await _wait_until(lambda: mock_get_quota.called)
+
+        mock_close.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("src.api._PRIME_TIMEOUT_SECONDS", 0.01)
+    @patch("src.api._get_quota_data")
+    async def test_prime_times_out(self, mock_get_quota, mock_get_client, mock_close, caplog):
+        """Test priming gives up after the overall timeout."""
+        mock_get_quota.side_effect = asyncio.Event().wait
+
+        async with src.api.lifespan(app):
+            await _wait_until(lambda: "Timed out priming quota cache" in caplog.text)
+
 
 class TestAPIEndpoints:
     """Integration tests for API endpoints using mocked data."""
 
-    @pytest.fixture
-    def client(self):
-        """Create test client."""
-        return TestClient(app)
+    @pytest_asyncio.fixture
+    async def client(self):
+        """Create an in-process ASGI test client."""
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
 
     @pytest.fixture
     def mock_quota_data(self):
@@ -269,54 +421,115 @@ class TestAPIEndpoints:
             }
         }
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_get_all_quota(self, mock_get_quota, client, mock_quota_data):
+    async def test_get_all_quota(self, mock_get_quota, client, mock_quota_data):
         """Test /quota/all endpoint returns all models."""
-        mock_get_quota.return_value = mock_quota_data
+        mock_get_quota.return_value = (mock_quota_data, 123456)
 
-        response = client.get("/quota/all")
+        response = await client.get("/quota/all")
 
         assert response.status_code == 200
         data = response.json()
         assert "quota" in data
         assert len(data["quota"]["models"]) == 3
+        assert data["quota"]["last_updated"] == 123456
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_get_gemini_3_pro(self, mock_get_quota, client, mock_quota_data):
+    async def test_get_gemini_3_pro(self, mock_get_quota, client, mock_quota_data):
         """Test /quota/pro endpoint."""
-        mock_get_quota.return_value = mock_quota_data
+        mock_get_quota.return_value = (mock_quota_data, 123456)
 
-        response = client.get("/quota/pro")
+        response = await client.get("/quota/pro")
 
         assert response.status_code == 200
         data = response.json()
         assert len(data["quota"]["models"]) == 1
         assert "gemini-3-pro" in data["quota"]["models"][0]["name"]
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_get_gemini_3_flash(self, mock_get_quota, client, mock_quota_data):
+    async def test_get_gemini_3_flash(self, mock_get_quota, client, mock_quota_data):
         """Test /quota/flash endpoint."""
-        mock_get_quota.return_value = mock_quota_data
+        mock_get_quota.return_value = (mock_quota_data, 123456)
 
-        response = client.get("/quota/flash")
+        response = await client.get("/quota/flash")
 
         assert response.status_code == 200
         data = response.json()
         assert len(data["quota"]["models"]) == 1
         assert data["quota"]["models"][0]["name"] == "gemini-3-flash"
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_get_claude_4_5(self, mock_get_quota, client, mock_quota_data):
+    async def test_get_claude_4_5(self, mock_get_quota, client, mock_quota_data):
         """Test /quota/claude endpoint."""
-        mock_get_quota.return_value = mock_quota_data
+        mock_get_quota.return_value = (mock_quota_data, 123456)
 
-        response = client.get("/quota/claude")
+        response = await client.get("/quota/claude")
 
         assert response.status_code == 200
         data = response.json()
         assert len(data["quota"]["models"]) == 1
         assert "claude" in data["quota"]["models"][0]["name"]
 
+    @pytest.mark.asyncio
+    @patch("src.api._get_quota_data")
+    async def test_response_is_cached(self, mock_get_quota, client, mock_quota_data):
+        """Test repeated requests reuse the cached response with Cache-Control."""
+        mock_get_quota.return_value = (mock_quota_data, int(time.time()))
+
+        first = await client.get("/quota/all")
+        second = await client.get("/quota/all")
+
+        assert second.json() == first.json()
+        assert second.headers["cache-control"].startswith("public, max-age=")
+        mock_get_quota.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("src.api._get_quota_data")
+    async def test_response_expires_with_upstream_data(self, mock_get_quota, client, mock_quota_data):
+        """Test responses are cached only until the upstream data is QUERY_DEBOUNCE old."""
+        fetched_at = int(time.time()) - src.api._RESPONSE_TTL + 30
+        mock_get_quota.return_value = (mock_quota_data, fetched_at)
+
+        response = await client.get("/quota/all")
+        max_age = int(response.headers["cache-control"].removeprefix("public, max-age="))
+        assert 28 <= max_age <= 30
+
+        # Data already older than the debounce window is not cached
+        mock_get_quota.return_value = (mock_quota_data, fetched_at - 60)
+        src.api._response_cache.clear()
+        await client.get("/quota/all")
+        await client.get("/quota/all")
+        assert mock_get_quota.call_count == 3
+
+    @pytest.mark.asyncio
+    @patch("src.api._get_quota_data")
+    async def test_stale_response_on_upstream_error(self, mock_get_quota, client, mock_quota_data):
+        """Test the last good response is served when the upstream query fails."""
+        mock_get_quota.return_value = (mock_quota_data, 123456)
+        first = await client.get("/quota/flash")
+
+        src.api._response_cache.clear()
+        mock_get_quota.side_effect = HTTPException(status_code=500, detail="upstream down")
+        response = await client.get("/quota/flash")
+
+        assert response.status_code == 200
+        assert response.json() == first.json()
+        assert response.headers["cache-control"] == "no-cache"
+
+    @pytest.mark.asyncio
+    @patch("src.api._get_quota_data")
+    async def test_upstream_error_without_stale_response(self, mock_get_quota, client):
+        """Test upstream errors propagate when nothing has been cached yet."""
+        mock_get_quota.side_effect = HTTPException(status_code=500, detail="upstream down")
+
+        response = await client.get("/quota/flash")
+
+        assert response.status_code == 500
+
 
 class TestQuotaStatusEndpoint:
     """Tests for /quota/status endpoint with various quota scenarios."""
@@ -331,10 +544,11 @@ class TestQuotaStatusEndpoint:
     FLASH_ICON = "F"
     CLAUDE_ICON = "󰛄"
 
-    @pytest.fixture
-    def client(self):
-        """Create test client."""
-        return TestClient(app)
+    @pytest_asyncio.fixture
+    async def client(self):
+        """Create an in-process ASGI test client."""
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
 
     def _make_quota_data(self, pro_pct, flash_pct, claude_pct):
         """Helper to create mock quota data with specific percentages."""
@@ -363,12 +577,13 @@ class TestQuotaStatusEndpoint:
             }
         }
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_all_100_percent(self, mock_get_quota, client):
+    async def test_all_100_percent(self, mock_get_quota, client):
         """Test all models at 100% - green icons, no time."""
-        mock_get_quota.return_value = self._make_quota_data(100, 100, 100)
+        mock_get_quota.return_value = (self._make_quota_data(100, 100, 100), 123456)
 
-        response = client.get("/quota/status")
+        response = await client.get("/quota/status")
 
         assert response.status_code == 200
         overview = response.json()["overview"]
@@ -384,12 +599,13 @@ class TestQuotaStatusEndpoint:
         assert not re.search(r"\d+h", clean_overview)
         assert not re.search(r"\d+m", clean_overview)
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_all_0_percent(self, mock_get_quota, client):
+    async def test_all_0_percent(self, mock_get_quota, client):
         """Test all models at 0% - red icons."""
-        mock_get_quota.return_value = self._make_quota_data(0, 0, 0)
+        mock_get_quota.return_value = (self._make_quota_data(0, 0, 0), 123456)
 
-        response = client.get("/quota/status")
+        response = await client.get("/quota/status")
 
         assert response.status_code == 200
         overview = response.json()["overview"]
@@ -400,12 +616,13 @@ class TestQuotaStatusEndpoint:
         # Should not have "0%" text
         assert "0%" not in overview
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_mixed_quotas_green_range(self, mock_get_quota, client):
+    async def test_mixed_quotas_green_range(self, mock_get_quota, client):
         """Test models in 50-99% range - green percentages with time."""
-        mock_get_quota.return_value = self._make_quota_data(75, 90, 55)
+        mock_get_quota.return_value = (self._make_quota_data(75, 90, 55), 123456)
 
-        response = client.get("/quota/status")
+        response = await client.get("/quota/status")
 
         assert response.status_code == 200
         overview = response.json()["overview"]
@@ -416,12 +633,13 @@ class TestQuotaStatusEndpoint:
         # Should have time (2h18m or 2h17m)
         assert "2h" in overview
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_yellow_range(self, mock_get_quota, client):
+    async def test_yellow_range(self, mock_get_quota, client):
         """Test models in 20-49% range - yellow percentages."""
-        mock_get_quota.return_value = self._make_quota_data(35, 45, 25)
+        mock_get_quota.return_value = (self._make_quota_data(35, 45, 25), 123456)
 
-        response = client.get("/quota/status")
+        response = await client.get("/quota/status")
 
         assert response.status_code == 200
         overview = response.json()["overview"]
@@ -430,12 +648,13 @@ class TestQuotaStatusEndpoint:
         assert f"{self.YELLOW}45%{self.RESET}" in overview
         assert f"{self.YELLOW}25%{self.RESET}" in overview
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_red_range(self, mock_get_quota, client):
+    async def test_red_range(self, mock_get_quota, client):
         """Test models in 1-19% range - red percentages."""
-        mock_get_quota.return_value = self._make_quota_data(5, 15, 1)
+        mock_get_quota.return_value = (self._make_quota_data(5, 15, 1), 123456)
 
-        response = client.get("/quota/status")
+        response = await client.get("/quota/status")
 
         assert response.status_code == 200
         overview = response.json()["overview"]
@@ -444,12 +663,13 @@ class TestQuotaStatusEndpoint:
         assert f"{self.RED}15%{self.RESET}" in overview
         assert f"{self.RED}1%{self.RESET}" in overview
 
+    @pytest.mark.asyncio
     @patch("src.api._get_quota_data")
-    def test_mixed_all_ranges(self, mock_get_quota, client):
+    async def test_mixed_all_ranges(self, mock_get_quota, client):
         """Test mixed quotas across all color ranges."""
-        mock_get_quota.return_value = self._make_quota_data(100, 45, 5)
+        mock_get_quota.return_value = (self._make_quota_data(100, 45, 5), 123456)
 
-        response = client.get("/quota/status")
+        response = await client.get("/quota/status")
 
         assert response.status_code == 200
         overview = response.json()["overview"]
@@ -1,16 +1,24 @@
 """Tests for src.cloudcode_client module."""
 
+import asyncio
+import errno
+import fcntl
 import json
+import os
+import stat
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from unittest.mock import MagicMock, mock_open, patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
+import src.cloudcode_client
 from src.cloudcode_client import (
     ensure_fresh_token,
     load_account,
     normalize_account,
+    save_account,
 )
 
 
@@ -33,6 +41,26 @@ class TestLoadAccount:
             result = load_account()
             assert result == account_data
 
+    def test_load_account_waits_for_in_place_write(self, tmp_path):
+        """Test that a read during another worker's in-place write sees the whole new file."""
+        account_file = tmp_path / "account.json"
+        account_file.write_text(json.dumps({"access_token": "old_access"}))
+        new_data = json.dumps({"access_token": "new_access", "refresh_token": "refresh456"})
+
+        with patch("src.cloudcode_client.ACCOUNT_FILE", account_file):
+            lock_fd = src.cloudcode_client._lock_account_file(fcntl.LOCK_EX)
+            # Truncated and half written, as another worker would leave it mid-write
+            account_file.write_text(new_data[:10])
+
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(load_account)
+                time.sleep(0.1)
+                assert not future.done()
+
+                account_file.write_text(new_data)
+                os.close(lock_fd)
+                assert future.result(timeout=5) == json.loads(new_data)
+
 
 class TestNormalizeAccount:
     """Tests for normalize_account function."""
@@ -91,23 +119,96 @@ class TestNormalizeAccount:
         assert expiry is None
         assert project is None
 
+    def test_normalize_repeated_account_uses_cache(self):
+        """Test that normalizing an unchanged flat account is served from the cache."""
+        account = {"access_token": "access123", "refresh_token": "refresh456", "expiry_timestamp": 1234567890}
+        first = normalize_account(account)
+        hits = src.cloudcode_client._normalize_flat.cache_info().hits
+
+        assert normalize_account(dict(account)) == first
+        assert src.cloudcode_client._normalize_flat.cache_info().hits == hits + 1
+
+
+class TestSaveAccount:
+    """Tests for save_account function."""
+
+    @pytest.fixture(autouse=True)
+    def clear_last_written_hash(self):
+        """Forget content written by earlier tests."""
+        src.cloudcode_client._last_written_hash = None
+
+    def test_save_account_replaces_file(self, tmp_path):
+        """Test the account is written without leaving a temp file behind."""
+        account_file = tmp_path / "account.json"
+        account_file.write_text("{}")
+
+        with patch("src.cloudcode_client.ACCOUNT_FILE", account_file):
+            save_account({"access_token": "new_access"})
+
+        assert json.loads(account_file.read_text()) == {"access_token": "new_access"}
+        assert [p.name for p in tmp_path.iterdir()] == ["account.json"]
+
+    def test_save_account_skips_unchanged_content(self, tmp_path):
+        """Test that writing identical content twice touches the file once."""
+        account_file = tmp_path / "account.json"
+
+        with patch("src.cloudcode_client.ACCOUNT_FILE", account_file), patch("os.replace") as mock_replace:
+            save_account({"access_token": "new_access"})
+            save_account({"access_token": "new_access"})
+
+        mock_replace.assert_called_once()
+
+    def test_save_account_keeps_file_mode(self, tmp_path):
+        """Test that replacing the file keeps its owner-only permissions."""
+        account_file = tmp_path / "account.json"
+        account_file.write_text("{}")
+        account_file.chmod(0o600)
+
+        with patch("src.cloudcode_client.ACCOUNT_FILE", account_file):
+            save_account({"access_token": "new_access"})
+
+        assert stat.S_IMODE(account_file.stat().st_mode) == 0o600
+
+    def test_save_account_writes_in_place_when_replace_fails(self, tmp_path):
+        """Test the in-place fallback when the file cannot be replaced, e.g. a bind mount."""
+        account_file = tmp_path / "account.json"
+        account_file.write_text("{}")
+
+        with (
+            patch("src.cloudcode_client.ACCOUNT_FILE", account_file),
+            patch("os.replace", side_effect=OSError(errno.EBUSY, "Device or resource busy")),
+        ):
+            save_account({"access_token": "new_access"})
+
+        assert json.loads(account_file.read_text()) == {"access_token": "new_access"}
+        assert [p.name for p in tmp_path.iterdir()] == ["account.json"]
+
 
 class TestEnsureFreshToken:
     """Tests for ensure_fresh_token function."""
 
-    def test_missing_access_token_raises_error(self):
+    @pytest.fixture(autouse=True)
+    def clear_refreshed_tokens(self):
+        """Forget tokens refreshed by earlier tests and reset the refresh lock."""
+        src.cloudcode_client._refreshed_tokens.clear()
+        src.cloudcode_client._token_refresh_lock = asyncio.Lock()
+
+    @pytest.mark.asyncio
+    async def test_missing_access_token_raises_error(self):
         """Test that ValueError is raised when access_token is missing."""
         account = {"refresh_token": "refresh123"}
         with pytest.raises(ValueError, match="Missing access_token or refresh_token"):
-            ensure_fresh_token(account)
+            await ensure_fresh_token(account)
 
-    def test_missing_refresh_token_raises_error(self):
+    @pytest.mark.asyncio
+    async def test_missing_refresh_token_raises_error(self):
         """Test that ValueError is raised when refresh_token is missing."""
         account = {"access_token": "access123"}
         with pytest.raises(ValueError, match="Missing access_token or refresh_token"):
-            ensure_fresh_token(account)
+            await ensure_fresh_token(account)
 
-    def test_fresh_token_returns_existing(self):
+    @pytest.mark.asyncio
+    async def test_fresh_token_returns_existing(self):
         """Test that fresh token is returned without refresh."""
         future_expiry = int(time.time()) + 600  # 10 minutes from now
         account = {
@@ -115,12 +216,12 @@ class TestEnsureFreshToken:
             "refresh_token": "refresh456",
             "expiry_timestamp": future_expiry,
         }
-        result = ensure_fresh_token(account)
+        result = await ensure_fresh_token(account)
         assert result == "access123"
 
+    @pytest.mark.asyncio
     @patch("src.cloudcode_client.refresh_access_token")
-    @patch("src.cloudcode_client.ACCOUNT_FILE", Path("/tmp/test_account.json"))
-    def test_expired_token_refreshes(self, mock_refresh):
+    async def test_expired_token_refreshes(self, mock_refresh, tmp_path):
         """Test that expired token triggers refresh."""
         past_expiry = int(time.time()) - 100  # expired
         account = {
@@ -133,9 +234,91 @@ class TestEnsureFreshToken:
             "expires_in": 3600,
             "token_type": "Bearer",
         }
+        account_file = tmp_path / "account.json"
+
+        with patch("src.cloudcode_client.ACCOUNT_FILE", account_file):
+            result = await ensure_fresh_token(account)
+
+        assert result == "new_access"
+        mock_refresh.assert_called_once_with("refresh456")
+        assert json.loads(account_file.read_text())["access_token"] == "new_access"
+
+    @pytest.mark.asyncio
+    @patch("src.cloudcode_client.refresh_access_token")
+    @patch("src.cloudcode_client.save_account")
+    async def test_force_refreshes_fresh_token(self, mock_save, mock_refresh):
+        """Test that force=True refreshes even when the token has not expired."""
+        account = {
+            "access_token": "rejected_access",
+            "refresh_token": "refresh456",
+            "expiry_timestamp": int(time.time()) + 600,
+        }
+        mock_refresh.return_value = {"access_token": "new_access", "expires_in": 3600}
+
+        result = await ensure_fresh_token(account, force=True)
+
+        assert result == "new_access"
+        mock_refresh.assert_called_once_with("refresh456")
+        mock_save.assert_called_once_with(account)
+
+    @pytest.mark.asyncio
+    @patch("src.cloudcode_client.refresh_access_token")
+    @patch("src.cloudcode_client.save_account")
+    async def test_force_ignores_concurrently_refreshed_token(self, mock_save, mock_refresh):
+        """Test that force=True does not hand back a shared token that may have been rejected."""
+        src.cloudcode_client._refreshed_tokens["refresh456"] = ("shared_access", int(time.time()) + 3600)
+        account = {
+            "access_token": "old_access",
+            "refresh_token": "refresh456",
+            "expiry_timestamp": int(time.time()) - 100,
+        }
+        mock_refresh.return_value = {"access_token": "new_access", "expires_in": 3600}
 
-        with patch("builtins.open", mock_open()):
-            result = ensure_fresh_token(account)
+        result = await ensure_fresh_token(account, force=True)
 
         assert result == "new_access"
         mock_refresh.assert_called_once_with("refresh456")
+
+    @pytest.mark.asyncio
+    @patch("src.cloudcode_client.refresh_access_token")
+    async def test_uses_token_refreshed_by_another_worker(self, mock_refresh, tmp_path):
+        """Test that a refresh waits for another worker's lock and reuses the token it saved."""
+        account = {
+            "access_token": "old_access",
+            "refresh_token": "refresh456",
+            "expiry_timestamp": int(time.time()) - 100,
+        }
+        account_file = tmp_path / "account.json"
+        account_file.write_text(json.dumps(account))
+        stored = {**account, "access_token": "other_worker_access", "expiry_timestamp": int(time.time()) + 3600}
+
+        with patch("src.cloudcode_client.ACCOUNT_FILE", account_file):
+            lock_fd = src.cloudcode_client._lock_account_file(fcntl.LOCK_EX)
+
+            def finish_other_worker():
+                account_file.write_text(json.dumps(stored))
+                os.close(lock_fd)
+
+            asyncio.get_running_loop().call_later(0.1, finish_other_worker)
+            result = await ensure_fresh_token(account)
+
+        assert result == "other_worker_access"
+        assert account == stored
+        mock_refresh.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("src.cloudcode_client.refresh_access_token")
+    @patch("src.cloudcode_client.save_account")
+    async def test_concurrent_refreshes_share_one_request(self, mock_save, mock_refresh):
+        """Test that concurrent requests with the same expired token refresh once."""
+        past_expiry = int(time.time()) - 100
+        accounts = [
+            {"access_token": "old_access", "refresh_token": "refresh456", "expiry_timestamp": past_expiry}
+            for _ in range(3)
+        ]
+        mock_refresh.return_value = {"access_token": "new_access", "expires_in": 3600}
+
+        results = await asyncio.gather(*(ensure_fresh_token(a) for a in accounts))
+
+        assert results == ["new_access"] * 3
+        mock_refresh.assert_called_once_with("refresh456")
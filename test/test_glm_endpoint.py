@@ -3,7 +3,8 @@
 import pytest
 
 from src.api import format_percentage_with_color
-from src.zai_client import format_glm_quota, process_quota_limit
+from src.models import GlmModel
+from src.zai_client import format_glm_quota, format_glm_quota_from_raw, process_quota_limit
 
 
 class TestProcessQuotaLimit:
@@ -85,7 +86,7 @@ class TestFormatGlmQuota:
         models = result["models"]
         assert len(models) == 4  # glm, mcp-monthly, search-prime, web-reader (no zread)
 
-        model_names = [m["name"] for m in models]
+        model_names = [m.name for m in models]
         assert "glm" in model_names
         assert "glm-coding-plan-mcp-monthly" in model_names
         assert "glm-coding-plan-search-prime" in model_names
@@ -96,9 +97,8 @@ class TestFormatGlmQuota:
 
         # Check that reset_time is not in any model
         for model in models:
-            assert "reset_time" not in model
-            assert "name" in model
-            assert "percentage" in model
+            assert not hasattr(model, "reset_time")
+            assert isinstance(model, GlmModel)
 
     def test_format_glm_quota_percentage_inversion(self):
         """Test that percentages are inverted (remaining = 100 - used)."""
@@ -121,17 +121,17 @@ class TestFormatGlmQuota:
         result = format_glm_quota(processed_data)
         models = result["models"]
 
-        glm_model = next(m for m in models if m["name"] == "glm")
-        assert glm_model["percentage"] == 75  # 100 - 25
+        glm_model = next(m for m in models if m.name == "glm")
+        assert glm_model.percentage == 75  # 100 - 25
 
-        mcp_model = next(m for m in models if m["name"] == "glm-coding-plan-mcp-monthly")
-        assert mcp_model["percentage"] == 90  # 100 - 10
+        mcp_model = next(m for m in models if m.name == "glm-coding-plan-mcp-monthly")
+        assert mcp_model.percentage == 90  # 100 - 10
 
-        search_model = next(m for m in models if m["name"] == "glm-coding-plan-search-prime")
-        assert search_model["percentage"] == 95  # 100 - 5
+        search_model = next(m for m in models if m.name == "glm-coding-plan-search-prime")
+        assert search_model.percentage == 95  # 100 - 5
 
-        web_model = next(m for m in models if m["name"] == "glm-coding-plan-web-reader")
-        assert web_model["percentage"] == 97  # 100 - 3
+        web_model = next(m for m in models if m.name == "glm-coding-plan-web-reader")
+        assert web_model.percentage == 97  # 100 - 3
 
     def test_format_glm_quota_with_empty_data(self):
         """Test GLM quota formatting with empty data."""
@@ -170,12 +170,47 @@ class TestFormatGlmQuota:
 
         # Should only have the overall MCP quota, not zread
         assert len(models) == 1
-        assert models[0]["name"] == "glm-coding-plan-mcp-monthly"
+        assert models[0].name == "glm-coding-plan-mcp-monthly"
 
-        model_names = [m["name"] for m in models]
+        model_names = [m.name for m in models]
         assert "glm-coding-plan-zread" not in model_names
 
 
+class TestFormatGlmQuotaFromRaw:
+    """Tests for format_glm_quota_from_raw function."""
+
+    def test_matches_two_stage_pipeline(self):
+        """Test single-pass formatting matches process_quota_limit + format_glm_quota."""
+        raw_data = {
+            "limits": [
+                {"type": "TOKENS_LIMIT", "percentage": 25},
+                {
+                    "type": "TIME_LIMIT",
+                    "percentage": 10,
+                    "currentValue": 10,
+                    "usage": 100,
+                    "usageDetails": [
+                        {"modelCode": "search-prime", "usage": 5},
+                        {"modelCode": "web-reader", "usage": 3},
+                        {"modelCode": "zread", "usage": 2},
+                    ],
+                },
+            ]
+        }
+
+        result = format_glm_quota_from_raw(raw_data)
+        expected = format_glm_quota(process_quota_limit(raw_data))
+
+        assert result["models"] == expected["models"]
+        assert result["is_forbidden"] is False
+        assert isinstance(result["last_updated"], int)
+
+    def test_empty_data(self):
+        """Test single-pass formatting with empty or missing limits."""
+        assert format_glm_quota_from_raw({})["models"] == []
+        assert format_glm_quota_from_raw({"limits": []})["models"] == []
+
+
 class TestFormatPercentageWithColorForGLM:
     """Tests for format_percentage_with_color function used in GLM status."""
 